@@ -18,7 +18,6 @@
 """Tool to update GSUB, hmtx, cmap, glyf tables with svg image glyphs."""
 
 import argparse
-import glob
 import os
 import re
 import sys
@@ -38,6 +37,19 @@ from nototools import add_emoji_gsub
 import svg_builder
 import svg_cleaner
 
+_glyph_name_cache = {}
+
+def _glyph_name(string):
+  """Memoized glyphstr-to-name conversion; ligature components repeat the
+  same short strings many times over."""
+  try:
+    return _glyph_name_cache[string]
+  except KeyError:
+    name = "_".join(["u%04X" % ord(char) for char in string])
+    _glyph_name_cache[string] = name
+    return name
+
+
 class FontBuilder(object):
   """A utility for mutating a ttx font.  This maintains glyph_order, cmap, and hmtx tables,
   and optionally GSUB, glyf, and SVN tables as well."""
@@ -45,6 +57,10 @@ class FontBuilder(object):
   def __init__(self, font):
     self.font = font;
     self.glyph_order = font.getGlyphOrder()
+    # glyph_name_to_index is called for every image glyph, so keep a
+    # name->index dict in step with glyph_order rather than scanning the list
+    self._name_to_index = dict(
+        (name, index) for index, name in enumerate(self.glyph_order))
     self.cmap = font['cmap'].tables[0].cmap
     self.hmtx = font['hmtx'].metrics
 
@@ -103,12 +119,13 @@ class FontBuilder(object):
       svg_table.colorPalettes = None
       font['SVG '] = svg_table
     self.svgs = font['SVG '].docList
+    self._pending_svgs = []
 
   def glyph_name(self, string):
-    return "_".join(["u%04X" % ord(char) for char in string])
+    return _glyph_name(string)
 
   def glyph_name_to_index(self, name):
-    return self.glyph_order.index(name) if name in self.glyph_order else -1;
+    return self._name_to_index.get(name, -1)
 
   def glyph_index_to_name(self, glyph_index):
     if glyph_index < len(self.glyph_order):
@@ -116,19 +133,16 @@ class FontBuilder(object):
     return ''
 
   def have_glyph(self, name):
-    return self.name_to_glyph_index >= 0
+    return self.glyph_name_to_index(name) >= 0
 
-  def _add_ligature(self, glyphstr):
+  def _add_ligature(self, glyphstr, lig_name, component_names):
+    """Add a ligature record. lig_name and component_names are the glyph names
+    for glyphstr and its characters, which the caller has already computed."""
     lig = otTables.Ligature()
     lig.CompCount = len(glyphstr)
-    lig.Component = [self.glyph_name(ch) for ch in glyphstr[1:]]
-    lig.LigGlyph = self.glyph_name(glyphstr)
-
-    first = self.glyph_name(glyphstr[0])
-    try:
-      self.ligatures[first].append(lig)
-    except KeyError:
-      self.ligatures[first] = [lig]
+    lig.Component = component_names[1:]
+    lig.LigGlyph = lig_name
+    self.ligatures.setdefault(component_names[0], []).append(lig)
 
   def _add_empty_glyph(self, glyphstr, name):
     """Create an empty glyph. If glyphstr is not a ligature, add a cmap entry for it."""
@@ -136,6 +150,7 @@ class FontBuilder(object):
       self.cmap[ord(glyphstr)] = name
     self.hmtx[name] = [0, 0]
     self.glyph_order.append(name)
+    self._name_to_index[name] = len(self.glyph_order) - 1
     if hasattr(self, 'glyphs'):
       self.glyphs[name] = _g_l_y_f.Glyph()
 
@@ -151,11 +166,11 @@ class FontBuilder(object):
     exists = index >= 0
     if not exists:
       if len(glyphstr) > 1:
-        for char in glyphstr:
+        component_names = [self.glyph_name(char) for char in glyphstr]
+        for char, char_name in zip(glyphstr, component_names):
           if ord(char) not in self.cmap:
-            char_name = self.glyph_name(char)
             self._add_empty_glyph(char, char_name)
-        self._add_ligature(glyphstr)
+        self._add_ligature(glyphstr, name, component_names)
       index = len(self.glyph_order)
       self._add_empty_glyph(glyphstr, name)
     return name, index, exists
@@ -170,6 +185,25 @@ class FontBuilder(object):
     svg_record = (doc, index, index) # startGlyphId, endGlyphId are the same
     self.svgs.append(svg_record)
 
+  def add_svg_tree(self, tree, to_text, hmetrics, name, index):
+    """Like add_svg, but takes the svg tree and its serializer and defers
+    serialization until flush_svgs; to_text is called on the tree then."""
+    assert name == self.glyph_index_to_name(index)
+    if hmetrics:
+      self.hmtx[name] = hmetrics
+    self._pending_svgs.append((tree, to_text, index))
+
+  def flush_svgs(self):
+    """Serialize any pending svg trees into the SVG table.  Callers adding
+    trees through add_svg_tree must call this before saving the font."""
+    pending = self._pending_svgs
+    self._pending_svgs = []
+    for i, (tree, to_text, index) in enumerate(pending):
+      # release each tree as soon as its text exists, so the node memory
+      # and the serialized documents never all coexist
+      pending[i] = None
+      self.svgs.append((to_text(tree), index, index))
+
 
 def collect_glyphstr_file_pairs(prefix, ext, include=None, exclude=None, verbosity=1):
   """Scan files with the given prefix and extension, and return a list of (glyphstr,
@@ -181,8 +215,10 @@ def collect_glyphstr_file_pairs(prefix, ext, include=None, exclude=None, verbosi
 
   image_files = {}
   glob_pat = "%s*.%s" % (prefix, ext)
-  leading = len(prefix)
-  trailing = len(ext) + 1 # include dot
+  dirname, base = os.path.split(prefix)
+  suffix = "." + ext
+  leading = len(base)
+  trailing = len(suffix)
   if verbosity:
     print "Looking for images matching '%s'." % glob_pat
   ex_count = 0
@@ -193,7 +229,12 @@ def collect_glyphstr_file_pairs(prefix, ext, include=None, exclude=None, verbosi
   if verbosity and ex:
     print "Excluding images matching '%s'." % exclude
 
-  for image_file in glob.glob(glob_pat):
+  # scan the directory once and match with prefix/suffix string checks
+  # instead of glob's fnmatch; listdir doesn't stat each entry
+  for entry in os.listdir(dirname or '.'):
+    if not (entry.startswith(base) and entry.endswith(suffix)):
+      continue
+    image_file = os.path.join(dirname, entry) if dirname else entry
     if inc and not inc.search(image_file):
       continue
 
@@ -203,7 +244,7 @@ def collect_glyphstr_file_pairs(prefix, ext, include=None, exclude=None, verbosi
       ex_count += 1
       continue
 
-    codes = image_file[leading:-trailing]
+    codes = entry[leading:-trailing]
     if "_" in codes:
       pieces = codes.split ("_")
       u = "".join ([unichr(int(code, 16)) for code in pieces])
@@ -220,11 +261,18 @@ def collect_glyphstr_file_pairs(prefix, ext, include=None, exclude=None, verbosi
   return image_files.items()
 
 
+def _glyphstr_sort_key(glyphstr_tuple):
+  # decorate each glyphstr with its codepoint tuple once, so the sort
+  # compares ints instead of re-walking the strings per comparison
+  glyphstr = glyphstr_tuple[0]
+  return len(glyphstr), tuple(map(ord, glyphstr))
+
+
 def sort_glyphstr_tuples(glyphstr_tuples):
   """The list contains tuples whose first element is a string representing a character or
-  ligature.  It is sorted with shorter glyphstrs first, then alphabetically. This ensures
+  ligature.  It is sorted with shorter glyphstrs first, then by codepoint. This ensures
   that ligature components are added to the font before any ligatures that contain them."""
-  glyphstr_tuples.sort(key=lambda t: (len(t[0]), t[0]))
+  glyphstr_tuples.sort(key=_glyphstr_sort_key)
 
 
 def add_image_glyphs(in_file, out_file, pairs, verbosity=1):
@@ -244,10 +292,14 @@ def add_image_glyphs(in_file, out_file, pairs, verbosity=1):
     font_builder.init_gsub()
 
   img_builder = svg_builder.SvgBuilder(font_builder)
-  for glyphstr, filename in pairs:
-    if verbosity > 1:
+  if verbosity > 1:
+    # stay serial when verbose so the per-glyph messages line up
+    for glyphstr, filename in pairs:
       print "Adding glyph for U+%s" % ",".join(["%04X" % ord(char) for char in glyphstr])
-    img_builder.add_from_filename(glyphstr, filename)
+      img_builder.add_from_filename(glyphstr, filename)
+  else:
+    img_builder.add_many(pairs, verbosity=verbosity)
+  font_builder.flush_svgs()
 
   font.saveXML(out_file, quiet=quiet)
   if verbosity:
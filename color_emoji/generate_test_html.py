@@ -25,6 +25,21 @@ from fontTools import ttx
 
 import add_svg_glyphs
 
+_cp_cache = {}
+
+def _cp_parts(code):
+  """Returns the ('0x...', '&#x...;') display and entity strings for a
+  codepoint, cached; emoji rows reuse a small set of codepoints (ZWJ,
+  variation selectors, modifiers)."""
+  try:
+    return _cp_cache[code]
+  except KeyError:
+    digits = '%x' % code
+    parts = ('0x' + digits, '&#x' + digits + ';')
+    _cp_cache[code] = parts
+    return parts
+
+
 def do_generate_test_html(font_basename, pairs, glyph=None, verbosity=1):
   header = r"""<!DOCTYPE html>
 <html>
@@ -98,13 +113,14 @@ View using Firefox&nbsp;26 and later.
   initial_glyph_str = None;
   initial_glyph_hex = None;
   text_parts = []
+  _ord = ord  # local binding for the per-codepoint loop
   for glyphstr, _ in pairs:
     name_parts = []
     hex_parts = []
-    for cp in glyphstr:
-      hex_str = hex(ord(cp))
-      name_parts.append('&#x%s;' % hex_str[2:])
-      hex_parts.append(hex_str)
+    for code in map(_ord, glyphstr):
+      hex_part, name_part = _cp_parts(code)
+      name_parts.append(name_part)
+      hex_parts.append(hex_part)
     glyph_str = ''.join(name_parts)
 
     if not found_initial_glyph:
@@ -116,22 +132,27 @@ View using Firefox&nbsp;26 and later.
         initial_glyph_str = glyph_str
         initial_glyph_hex = ' '.join(hex_parts)
 
-    text = '<span>%s</span>' % glyph_str
-    text_parts.append(text)
+    # concatenation skips re-parsing a format string on every row; rows
+    # carry their own newline so they can be written out as-is
+    text_parts.append('<span>' + glyph_str + '</span>\n')
 
   if verbosity and glyph and not found_initial_glyph:
     print "Did not find glyph '%s', using initial glyph '%s'" % (glyph, initial_glyph_str)
   elif verbosity > 1 and not glyph:
     print "Using initial glyph '%s'" % initial_glyph_str
 
-  lines = [header % font_name]
-  lines.append(body_head % {'font':font_name, 'glyph':initial_glyph_str,
-                            'glyph_hex':initial_glyph_hex})
-  lines.extend(text_parts) # we'll end up with space between each emoji
-  lines.append(body_tail)
-  output = '\n'.join(lines)
-  with open(html_name, 'w') as fp:
-    fp.write(output)
+  # stream the parts straight to the file rather than joining one big
+  # output string first; binary mode skips newline translation, and the
+  # content is ascii byte strings so there is nothing to encode
+  with open(html_name, 'wb') as fp:
+    fp.write(header % font_name)
+    fp.write('\n')
+    fp.write(body_head % {'font':font_name, 'glyph':initial_glyph_str,
+                          'glyph_hex':initial_glyph_hex})
+    fp.write('\n')
+    # the newline after each row leaves space between each emoji
+    fp.writelines(text_parts)
+    fp.write(body_tail)
   if verbosity:
     print 'Wrote ' + html_name
 
@@ -157,7 +178,14 @@ def do_generate_fonts(template_file, font_basename, pairs, reuse=0, verbosity=1)
     print 'Wrote ' + out_woff
 
 
-def main(argv):
+_arg_parser = None
+
+def _build_arg_parser():
+  # built once and reused, for callers that invoke main per font variant
+  global _arg_parser
+  if _arg_parser is not None:
+    return _arg_parser
+
   usage = """This will search for files that have image_prefix followed by one or more
       hex numbers (separated by underscore if more than one), and end in ".svg".
       For example, if image_prefix is "icons/u", then files with names like
@@ -183,7 +211,12 @@ def main(argv):
                       action='store_const', const=0)
   parser.add_argument('-v', '--verbose', dest='v', help='verbose operation',
                       action='store_const', const=2)
-  args = parser.parse_args(argv)
+  _arg_parser = parser
+  return parser
+
+
+def main(argv):
+  args = _build_arg_parser().parse_args(argv)
 
   pairs = add_svg_glyphs.collect_glyphstr_file_pairs(
     args.image_prefix, 'svg', include=args.include, exclude=args.exclude, verbosity=args.v)
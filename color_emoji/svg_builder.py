@@ -15,12 +15,30 @@
 # Google Author(s): Doug Felt
 
 import math
+import multiprocessing
 import random
 import re
 import string
 
 import svg_cleaner
 
+
+def _prepare_from_filename(glyphstr_and_filename):
+  """Reads, parses, and cleans one svg file; module level so a worker pool
+  can pickle it.  The cleaner strips viewBox, width, and height from the
+  root element, so they are captured before cleaning."""
+  glyphstr, filename = glyphstr_and_filename
+  with open(filename, "rb") as fp:
+    data = fp.read()
+  cleaner = svg_cleaner.SvgCleaner()
+  tree = cleaner.tree_from_text(data)
+  attrs = tree.attrs
+  view_box = attrs.get('viewBox')
+  width = attrs.get('width')
+  height = attrs.get('height')
+  cleaner.clean_tree(tree)
+  return glyphstr, tree, view_box, width, height
+
 class SvgBuilder(object):
   """Modifies a font to add SVG glyphs from a document or string.  Once built you
   can call add_from_filename or add_from_doc multiple times to add SVG
@@ -51,11 +69,14 @@ class SvgBuilder(object):
 
     font = font_builder.font
     self.font_ascent = font['hhea'].ascent
-    self.font_height = self.font_ascent - font['hhea'].descent
+    # kept as a float so the per-glyph scale math never re-coerces it
+    self.font_height = float(self.font_ascent - font['hhea'].descent)
     self.font_upem = font['head'].unitsPerEm
 
   def add_from_filename(self, ustr, filename):
-    with open(filename, "r") as fp:
+    # read raw bytes; expat handles the encoding itself, so a text-mode
+    # pass over the data buys nothing
+    with open(filename, "rb") as fp:
       return self.add_from_doc(ustr, fp.read(), filename=filename)
 
   def _strip_px(self, val):
@@ -67,6 +88,39 @@ class SvgBuilder(object):
     string, svgdoc is the svg document xml.  The doc must have a single
     svg root element."""
 
+    cleaner = self.cleaner
+    tree = cleaner.tree_from_text(svgdoc)
+    attrs = tree.attrs
+    view_box = attrs.get('viewBox')
+    width = attrs.get('width')
+    height = attrs.get('height')
+    cleaner.clean_tree(tree)
+    self._add_prepared(ustr, tree, view_box, width, height)
+
+  def add_many(self, pairs, verbosity=1):
+    """Adds images for a list of (glyphstr, filename) pairs.  The parse and
+    clean passes are independent per file, so they fan out to a pool of
+    workers, one per core; the font updates run here in the original order
+    since they mutate shared tables."""
+    if len(pairs) < 2:
+      for glyphstr, filename in pairs:
+        self.add_from_filename(glyphstr, filename)
+      return
+
+    pool = multiprocessing.Pool()
+    try:
+      prepared = pool.map(_prepare_from_filename, pairs)
+    finally:
+      pool.close()
+      pool.join()
+    for glyphstr, tree, view_box, width, height in prepared:
+      self._add_prepared(glyphstr, tree, view_box, width, height)
+
+  def _add_prepared(self, ustr, tree, view_box, width, height):
+    """Tweaks the root element of a cleaned svg tree and updates the font.
+    view_box, width, and height are the root element's attribute values
+    from before cleaning, which strips them."""
+
     # The svg element must have an id attribute of the form 'glyphNNN' where NNN
     # is the glyph id.  We capture the index of the glyph we're adding and write
     # it into the svg.
@@ -91,10 +145,13 @@ class SvgBuilder(object):
     # of the viewBox, or if it is not defined, the viewport.  Since we can't
     # define the viewport, we must always have a viewBox.
 
+    # bind the attributes this method hammers on to locals; it runs once
+    # per image and LOAD_FAST beats repeated attribute lookups
     cleaner = self.cleaner
     fbuilder = self.font_builder
-
-    tree = cleaner.tree_from_text(svgdoc)
+    font_ascent = self.font_ascent
+    font_height = self.font_height
+    strip_px = self._strip_px
 
     name, index, exists = fbuilder.add_components_and_ligature(ustr)
 
@@ -102,15 +159,12 @@ class SvgBuilder(object):
     if exists:
       advance = fbuilder.hmtx[name][0]
 
-    vb = tree.attrs.get('viewBox')
-    if vb:
-      x, y, w, h = map(self._strip_px, re.split('\s*,\s*|\s+', vb))
+    if view_box:
+      x, y, w, h = map(strip_px, re.split('\s*,\s*|\s+', view_box))
     else:
-      wid = tree.attrs.get('width')
-      ht = tree.attrs.get('height')
-      if not (wid and ht):
-        raise "missing viewBox and width or height attrs"
-      x, y, w, h = 0, 0, self._strip_px(wid), self._strip_px(ht)
+      if not (width and height):
+        raise ValueError("missing viewBox and width or height attrs")
+      x, y, w, h = 0, 0, strip_px(width), strip_px(height)
 
     # We're going to assume default values for preserveAspectRatio for now,
     # this preserves aspect ratio and centers in the viewport.
@@ -142,14 +196,14 @@ class SvgBuilder(object):
     # smaller of the scales that fit its height or width.  We start with height,
     # if there's no advance then we're done, otherwise we might have to fit the
     # advance.
-    scale = self.font_height / h_in_viewport
+    scale = font_height / h_in_viewport
     fit_height = True
     if advance and scale * w_in_viewport > advance:
       scale = advance / w_in_viewport
       fit_height = False
 
     # Compute transforms that put the top left of the image where we want it.
-    ty = -self.font_ascent - scale * y_in_viewport
+    ty = -font_ascent - scale * y_in_viewport
     tx = -scale * x_in_viewport
 
     # Adjust them to center the image horizontally if we fit the full height,
@@ -157,16 +211,15 @@ class SvgBuilder(object):
     if fit_height and advance:
       tx += (advance - scale * w_in_viewport) / 2
     else:
-      ty += (self.font_height - scale * h_in_viewport) / 2
+      ty += (font_height - scale * h_in_viewport) / 2
 
-    cleaner.clean_tree(tree)
-
-    tree.attrs['id'] = 'glyph%s' % index
+    attrs = tree.attrs
+    attrs['id'] = 'glyph%s' % index
 
     transform = 'translate(%g, %g) scale(%g)' % (tx, ty, scale)
-    tree.attrs['transform'] = transform
+    attrs['transform'] = transform
 
-    tree.attrs['viewBox'] = '%g %g %g %g' % (x, y, w, h)
+    attrs['viewBox'] = '%g %g %g %g' % (x, y, w, h)
 
     # In order to clip, we need to create a path and reference it.  You'd think
     # establishing a rectangular clip would be simpler...  Aaaaand... as it
@@ -176,14 +229,16 @@ class SvgBuilder(object):
     # insert a group with the clip between the svg and its children.  The latter
     # seems cleaner, ultimately.
     clip_id = 'clip_' + ''.join(random.choice(string.ascii_lowercase) for i in range(8))
-    clip_text = """<g clip-path="url(#%s)"><clipPath id="%s">
-      <path d="M%g %gh%gv%gh%gz"/></clipPath></g>""" % (clip_id, clip_id, x, y, w, h, -w)
-    clip_tree = cleaner.tree_from_text(clip_text)
+    # build the clip group nodes directly instead of running a small xml
+    # document through expat for every glyph
+    clip_path = cleaner.new_element('clipPath', {'id': clip_id}, [
+        cleaner.new_element(
+            'path', {'d': 'M%g %gh%gv%gh%gz' % (x, y, w, h, -w)}, [])])
+    clip_tree = cleaner.new_element(
+        'g', {'clip-path': 'url(#%s)' % clip_id}, [clip_path])
     clip_tree.contents.extend(tree.contents)
     tree.contents = [clip_tree]
 
-    svgdoc = cleaner.tree_to_text(tree)
-
     hmetrics = None
     if not exists:
       # There was no advance to fit, so no horizontal centering. The image advance is
@@ -192,4 +247,6 @@ class SvgBuilder(object):
       advance = scale * w_in_viewport
       hmetrics = [int(round(advance)), 0]
 
-    fbuilder.add_svg(svgdoc, hmetrics, name, index)
+    # hand the tree over as-is; the font builder serializes the whole batch
+    # when its flush_svgs is called
+    fbuilder.add_svg_tree(tree, cleaner.tree_to_text, hmetrics, name, index)
@@ -32,6 +32,11 @@ from xml.sax import saxutils
 # Use nodes instead of tuples and strings because it's easier to mutate
 # a tree of these, and cleaner will want to do this.
 
+# compiled once; the cleaner runs this over every attribute value and text
+# node of every svg
+_whitespace_re = re.compile(r'\s+')
+
+
 class _Elem_Node(object):
   def __init__(self, name, attrs, contents):
     self.name = name
@@ -83,17 +88,18 @@ class SvgCleaner(object):
     def _start_element(self, name, attrs):
       self._flush_textbuf()
       node = _Elem_Node(name, attrs, [])
-      if len(self._stack):
+      if self._stack:
         self._stack[-1].contents.append(node)
       self._stack.append(node)
 
     def _end_element(self, name):
       self._flush_textbuf()
       if len(self._stack) > 1:
-        self._stack = self._stack[:-1]
+        # pop in place; slicing would copy the stack for every element
+        self._stack.pop()
 
     def _character_data(self, data):
-      if len(self._stack):
+      if self._stack:
         self._textbuf.append(data)
 
     def _flush_textbuf(self):
@@ -114,14 +120,17 @@ class SvgCleaner(object):
       return self._stack[0]
 
   class _Cleaner(object):
+    _strip_svg_attrs = frozenset([
+        'x', 'y', 'id', 'version', 'viewBox', 'width', 'height',
+        'enable-background', 'xml:space'])
+
     def _clean_elem(self, node):
       nattrs = {}
+      strip_svg_attrs = self._strip_svg_attrs if node.name == 'svg' else ()
       for k, v in node.attrs.items():
-        if node.name == 'svg' and k in [
-            'x', 'y', 'id', 'version', 'viewBox', 'width', 'height',
-            'enable-background', 'xml:space']:
+        if k in strip_svg_attrs:
           continue
-        v = re.sub('\s+', ' ', v)
+        v = _whitespace_re.sub(' ', v)
         nattrs[k] = v
       node.attrs = nattrs
 
@@ -147,7 +156,7 @@ class SvgCleaner(object):
       text = node.text.strip()
       # common case is text is empty (line endings between elements)
       if text:
-        text = re.sub(r'\s+', ' ', text)
+        text = _whitespace_re.sub(' ', text)
       node.text = text
 
     def clean(self, node):
@@ -198,6 +207,11 @@ class SvgCleaner(object):
       self._write_node(root, lines, 0)
       return '\n'.join(lines)
 
+  def new_element(self, name, attrs, contents):
+    """Returns a new element node, for callers that build small tree
+    fragments directly instead of parsing text."""
+    return _Elem_Node(name, attrs, contents)
+
   def tree_from_text(self, svg_text):
     return self.reader.from_text(svg_text)
 
@@ -1,6 +1,6 @@
 #!/usr/bin/python
 
-import glob, sys
+import os, sys
 from fontTools import ttx
 from fontTools.ttLib.tables import otTables
 from png import PNG
@@ -9,11 +9,19 @@ sys.path.append('../../nototools')
 from nototools import add_emoji_gsub
 
 
+_glyph_name_cache = {}
+
 def glyph_name(string):
-	return "_".join (["u%04X" % ord (char) for char in string])
+	# memoized; the same components recur across every ligature
+	try:
+		return _glyph_name_cache[string]
+	except KeyError:
+		name = "_".join (["u%04X" % ord (char) for char in string])
+		_glyph_name_cache[string] = name
+		return name
 
 
-def add_ligature (font, string):
+def add_ligature (font, string, lig_name, component_names):
 	if 'GSUB' not in font:
 		ligature_subst = otTables.LigatureSubst()
 		ligature_subst.ligatures = {}
@@ -32,16 +40,13 @@ def add_ligature (font, string):
 
 	ligatures = lookup.SubTable[0].ligatures
 
+	# the caller already computed the glyph names, so take them as-is
 	lig = otTables.Ligature()
 	lig.CompCount = len(string)
-	lig.Component = [glyph_name(ch) for ch in string[1:]]
-	lig.LigGlyph = glyph_name(string)
+	lig.Component = component_names[1:]
+	lig.LigGlyph = lig_name
 
-	first = glyph_name(string[0])
-	try:
-		ligatures[first].append(lig)
-	except KeyError:
-		ligatures[first] = [lig]
+	ligatures.setdefault (component_names[0], []).append (lig)
 
 
 if len (sys.argv) < 4:
@@ -73,8 +78,13 @@ font.importXML (in_file)
 img_files = {}
 glb = "%s*.png" % img_prefix
 print "Looking for images matching '%s'." % glb
-for img_file in glob.glob (glb):
-	codes = img_file[len (img_prefix):-4]
+img_dir, img_base = os.path.split (img_prefix)
+# one directory scan with string prefix/suffix checks instead of glob
+for entry in os.listdir (img_dir or '.'):
+	if not (entry.startswith (img_base) and entry.endswith (".png")):
+		continue
+	img_file = os.path.join (img_dir, entry) if img_dir else entry
+	codes = entry[len (img_base):-4]
 	if "_" in codes:
 		pieces = codes.split ("_")
 		u = "".join ([unichr (int (code, 16)) for code in pieces])
@@ -93,24 +103,32 @@ h = font['hmtx'].metrics
 
 # Sort the characters by length, then codepoint, to keep the order stable
 # and avoid adding empty glyphs for multi-character glyphs if any piece is
-# also included.
-img_pairs = img_files.items ()
-img_pairs.sort (key=lambda pair: (len (pair[0]), pair[0]))
-
-for (u, filename) in img_pairs:
-	print "Adding glyph for U+%s" % ",".join (["%04X" % ord (char) for char in u])
-	n = glyph_name (u)
-	g.append (n)
+# also included.  The codepoint tuples and glyph names are computed once up
+# front; the tuples double as the sort key, and int compares beat string
+# compares.
+img_records = [(u, filename, tuple (map (ord, u)), glyph_name (u))
+		for (u, filename) in img_files.items ()]
+img_records.sort (key=lambda r: (len (r[2]), r[2]))
+
+# Track mapped codepoints in a set and collect new glyph names, extending
+# the glyph order once at the end instead of appending per image.
+known_chars = set (c)
+new_glyph_names = []
+for (u, filename, codepoints, n) in img_records:
+	print "Adding glyph for U+%s" % ",".join (["%04X" % code for code in codepoints])
+	new_glyph_names.append (n)
 	for char in u:
-		if char not in c:
+		if ord (char) not in known_chars:
 			name = glyph_name (char)
 			c[ord (char)] = name
+			known_chars.add (ord (char))
 			if len (u) > 1:
 				h[name] = [0, 0]
 	(img_width, img_height) = PNG (filename).get_size ()
 	advance = int (round ((float (ascent+descent) * img_width / img_height)))
 	h[n] = [advance, 0]
 	if len (u) > 1:
-		add_ligature (font, u)
+		add_ligature (font, u, n, [glyph_name (char) for char in u])
+g.extend (new_glyph_names)
 
 font.saveXML (out_file)
@@ -28,17 +28,33 @@
 # a customization file that allows this api.
 
 import argparse
+import bisect
+import operator
 import re
 
 
-def parse_int_values(intlist, is_hex):
-  """Returns a set of ints from a list of hex numbers or ranges separated by space.
-  A range is two hex values separated by hyphen with no intervening spaces."""
-  result = set()
-  count = 0
+_compiled_regex_cache = {}
+
+def _compile_regex(pattern):
+  """Returns a compiled regex for pattern, reusing compiled objects.
+  Spec files tend to repeat the same 'like' patterns across conditions."""
+  regex = _compiled_regex_cache.get(pattern)
+  if regex is None:
+    regex = re.compile(pattern)
+    _compiled_regex_cache[pattern] = regex
+  return regex
+
+
+def parse_int_ranges(intlist, is_hex):
+  """Returns a sorted list of non-overlapping (lo, hi) pairs of ints from a
+  list of hex numbers or ranges separated by space.  A range is two hex values
+  separated by hyphen with no intervening spaces.  Raises if any value is
+  repeated; adjacent ranges are coalesced."""
+  ranges = []
   base = 16 if is_hex else 10
-  value_list = intlist.split(' ')
-  for val in value_list:
+  # no-arg split tokenizes on any whitespace run without producing the empty
+  # strings that split(' ') yields on repeated spaces
+  for val in intlist.split():
     if '-' in val: # assume range
       val_list = val.split('-')
       if len(val_list) != 2:
@@ -47,30 +63,58 @@ def parse_int_values(intlist, is_hex):
       hi = int(val_list[1], base)
       if lo >= hi:
         raise ValueError('val range must have high > low')
-      result.update(range(lo, hi + 1))
-      count += hi - lo + 1
+      ranges.append((lo, hi))
+    else:
+      v = int(val, base)
+      ranges.append((v, v))
+
+  ranges.sort()
+  merged = ranges[:1]
+  for lo, hi in ranges[1:]:
+    last_lo, last_hi = merged[-1]
+    if lo <= last_hi:
+      raise ValueError('duplicate values in %s' % intlist)
+    if lo == last_hi + 1:
+      merged[-1] = (last_lo, hi)
     else:
-      result.add(int(val, base))
-      count += 1
-  if len(result) != count:
-    raise ValueError('duplicate values in %s, expected count is %d but result is %s' % (
-        hexlist, count, result))
+      merged.append((lo, hi))
+  return merged
+
+
+def parse_int_values(intlist, is_hex):
+  """Returns a set of ints from a list of hex numbers or ranges separated by space.
+  A range is two hex values separated by hyphen with no intervening spaces."""
+  result = set()
+  for lo, hi in parse_int_ranges(intlist, is_hex):
+    # xrange feeds update without materializing the range as a list
+    result.update(xrange(lo, hi + 1))
   return result
 
 
 class IntSetFilter(object):
-  """Tests whether an int (glyph or code point) is in a set."""
+  """Tests whether an int (glyph or code point) is in a set of values.
+  The values are kept as sorted non-overlapping (lo, hi) intervals rather
+  than expanded, so specs covering large codepoint ranges cost a bisect per
+  test instead of holding one set entry per codepoint."""
 
-  def __init__(self, accept_if_in, intset):
+  def __init__(self, accept_if_in, intranges):
     self.accept_if_in = accept_if_in
-    self.intset = intset
-    # print 'IntSetFilter %s %s' % ('only' if accept_if_in else 'except', intset)
+    self._los = [lo for lo, _ in intranges]
+    self._his = [hi for _, hi in intranges]
+    # print 'IntSetFilter %s %s' % ('only' if accept_if_in else 'except', intranges)
 
   def accept(self, cp):
-    return self.accept_if_in == (cp in self.intset)
+    ix = bisect.bisect_right(self._los, cp) - 1
+    in_set = ix >= 0 and cp <= self._his[ix]
+    return self.accept_if_in == in_set
 
 
 class FontInfo(object):
+  # lint runs create one of these per font and accepts probes the attributes
+  # repeatedly, so avoid the per-instance dict
+  __slots__ = ('filename', 'name', 'style', 'script', 'variant', 'weight',
+               'monospace', 'hinted', 'vendor', 'version')
+
   def __init__(self, filename, name, style, script, variant, weight, monospace,
                hinted, vendor, version):
     self.filename = filename
@@ -85,7 +129,7 @@ class FontInfo(object):
     self.version = version
 
   def __repr__(self):
-    return str(self.__dict__)
+    return str({k: getattr(self, k) for k in self.__slots__})
 
 
 class FontCondition(object):
@@ -124,6 +168,10 @@ class FontCondition(object):
 
   fn_map = _init_fn_map()
 
+  condition_fields = ('filename', 'name', 'style', 'script', 'variant', 'weight',
+                      'hinted', 'vendor', 'version')
+
+  __slots__ = condition_fields + ('_predicates',)
 
   def __init__(self, filename=None, name=None, style=None, script=None, variant=None, weight=None,
                hinted=None, vendor=None, version=None):
@@ -140,27 +188,46 @@ class FontCondition(object):
     self.hinted = hinted
     self.vendor = vendor
     self.version = version
+    self._build_predicates()
+
+  def _build_predicates(self):
+    """Compile the non-empty conditions into a list of (attr_name, fn, value)
+    tuples so accepts only visits conditions that are actually set.  The
+    string-or-pair storage is resolved here, once, so accepts is a uniform
+    fn(val, value) loop; literal strings test with operator.eq."""
+    predicates = []
+    for k in self.condition_fields:
+      test = getattr(self, k, None)
+      if test:
+        if isinstance(test, basestring):
+          predicates.append((k, operator.eq, test))
+        else:
+          predicates.append((k, test[0], test[1]))
+    self._predicates = predicates
 
   def modify(self, condition_name, fn_name, value):
-    if not condition_name in self.__dict__:
+    if not condition_name in self.condition_fields:
       raise ValueError('FontCondition does not recognize: %s' % condition_name)
 
     if fn_name == '*':
       # no condition
-      self.__dict__[condition_name] = None
+      setattr(self, condition_name, None)
+      self._build_predicates()
       return
 
     if not value:
       # fn_name is value
-      self.__dict__[condition_name] = fn_name
+      setattr(self, condition_name, fn_name)
+      self._build_predicates()
       return
 
     fn = self.fn_map[fn_name]
     if fn_name == 'in':
-      value = set(value.split(','))
+      value = frozenset(value.split(','))
     elif fn_name == 'like':
-      value = re.compile(value)
-    self.__dict__[condition_name] = (fn, value)
+      value = _compile_regex(value)
+    setattr(self, condition_name, (fn, value))
+    self._build_predicates()
 
   line_re = re.compile(r'([^ \t]+)\s+([^ \t]+)(.*)?')
   def modify_line(self, line):
@@ -178,28 +245,18 @@ class FontCondition(object):
     self.modify(condition_name, fn_name, value)
 
   def copy(self):
-    return FontCondition(
-        filename=self.filename, name=self.name, style=self.style, script=self.script,
-        variant=self.variant, weight=self.weight, hinted=self.hinted, vendor=self.vendor,
-        version=self.version)
+    return FontCondition(**{k: getattr(self, k) for k in self.condition_fields})
 
   def accepts(self, fontinfo):
-    for k in ['filename', 'name', 'style', 'script', 'variant', 'weight', 'hinted', 'vendor',
-              'version']:
-      test = getattr(self, k, None)
-      if test:
-        val = getattr(fontinfo, k, None)
-        if isinstance(test, basestring):
-          if test != val:
-            return False
-          continue
-        if not test[0](val, test[1]):
-          return False
+    for k, fn, value in self._predicates:
+      if not fn(getattr(fontinfo, k, None), value):
+        return False
 
     return True
 
   def __repr__(self):
-    output = ['%s: %s' % (k,v) for k,v in self.__dict__.iteritems() if v]
+    output = ['%s: %s' % (k, getattr(self, k)) for k in self.condition_fields
+              if getattr(self, k)]
     return 'FontCondition(%s)' % ', '.join(output)
 
 
@@ -313,20 +370,26 @@ class TestSpec(object):
   def _process_data(data):
     """data is a hierarchy of tags. any level down to root can be enabled or disabled.  this
     builds a representation of the tag hierarchy from the text description."""
-    _data_line_re = re.compile(r'(\s*)([a-z0-9_]+)(?:\s+([^\s]+)\s+([^\s]+))?\s*(?:--\s*(.+)\s*)?$')
     tag_data = {}
     indent = (0, '', None)
     for line in data.splitlines():
-      if not line.strip():
+      stripped = line.lstrip()
+      if not stripped:
         continue
-      m = _data_line_re.match(line)
-      if not m:
-        raise ValueError('failed to match line: \'%s\'' % line)
-      line_indent = m.group(1)
-      tag_part = m.group(2)
-      relation = m.group(3)
-      arg_type = m.group(4)
-      comment = m.group(5)
+      # scan the line directly, the format is too simple to need a regex:
+      # indent, tag, optional relation and arg type, optional '--' comment
+      line_indent = line[:len(line) - len(stripped)]
+      body, _, comment = stripped.partition('--')
+      comment = comment.strip() or None
+      fields = body.split()
+      relation = None
+      arg_type = None
+      if len(fields) == 1:
+        tag_part = fields[0]
+      elif len(fields) == 3:
+        tag_part, relation, arg_type = fields
+      else:
+        raise ValueError('failed to parse line: \'%s\'' % line)
 
       while line_indent <= indent[0]:
         if indent[2]:
@@ -338,7 +401,10 @@ class TestSpec(object):
         tag += '/' + tag_part
       else:
         tag = tag_part
-      tag_data[tag] = (relation, arg_type, comment)
+      # precompile the relation and arg type regexes, they get matched each
+      # time options are applied to this tag
+      tag_data[tag] = (relation and re.compile(relation),
+                       arg_type and re.compile(arg_type), comment)
       if line_indent > indent[0]:
         indent = (line_indent, tag, indent)
     return tag_data
@@ -346,41 +412,59 @@ class TestSpec(object):
   tag_data = _process_data(data)
   tag_set = frozenset(tag_data.keys())
 
+  def _build_segment_index(tag_set):
+    """Index every '/'- or '_'-bounded substring of every tag, so a partial
+    tag resolves with one dict lookup instead of a scan over all tags."""
+    index = {}
+    for tag in tag_set:
+      starts = [0] + [ix + 1 for ix, ch in enumerate(tag) if ch in '/_']
+      ends = [ix for ix, ch in enumerate(tag) if ch in '/_'] + [len(tag)]
+      for s in starts:
+        for e in ends:
+          if e > s:
+            index.setdefault(tag[s:e], set()).add(tag)
+    return index
+
+  _segment_index = _build_segment_index(tag_set)
+
+  # stable int id per tag, so sets of tags can be manipulated as int bitmasks
+  _id_to_tag = sorted(tag_set)
+  _tag_ids = dict((tag, ix) for ix, tag in enumerate(_id_to_tag))
+  _full_mask = (1 << len(_id_to_tag)) - 1
+
   def __init__(self):
     self.touched_tags = set()
     self.enabled_tags = set()
     self.tag_options = {}
+    self._masks = None
 
   def _get_single_tag(self, tag):
     """Resolve tag to a single node"""
     if not tag in self.tag_set:
-      unique_tag = None
-      # try to find a unique tag with this as a segment
-      for t in TestSpec.tag_set:
-        ix = t.find(tag)
-        if ix != -1:
-          if ix > 0 and t[ix-1] not in '/_':
-            continue
-          ix += len(tag)
-          if ix < len(t) and t[ix] not in '/_':
-            continue
-          if unique_tag:
-            raise ValueError('multiple matches for partial tag %s' % tag)
-          unique_tag = t
-      if not unique_tag:
+      matches = TestSpec._segment_index.get(tag)
+      if not matches:
         raise ValueError('unknown tag: %s' % tag)
-      tag = unique_tag
+      if len(matches) > 1:
+        raise ValueError('multiple matches for partial tag %s' % tag)
+      tag, = matches
     return tag
 
+  # cache of resolved tag -> frozenset of tag and descendants, the same few
+  # tags recur across spec files and fonts
+  _tag_set_cache = {}
+
   def _get_tag_set(self, tag):
     """Resolve tag to a single node, and return it and all of its descendants."""
     if tag == '*':
       return TestSpec.tag_set
-    tag = self._get_single_tag(tag)
-    result = set()
-    for candidate in self.tag_set:
-      if candidate.startswith(tag):
-        result.add(candidate)
+    try:
+      return TestSpec._tag_set_cache[tag]
+    except KeyError:
+      pass
+    single_tag = self._get_single_tag(tag)
+    result = frozenset(
+        candidate for candidate in self.tag_set if candidate.startswith(single_tag))
+    TestSpec._tag_set_cache[tag] = result
     return result
 
   def _get_ancestor_tag_set(self, tag):
@@ -400,16 +484,16 @@ class TestSpec(object):
     allowed_options = TestSpec.tag_data[tag]
     if not allowed_options[0]:
       raise ValueError('tag %s does not allow options' % tag)
-    if not re.match(allowed_options[0], relation):
+    if not allowed_options[0].match(relation):
       raise ValueError('tag %s does not allow relation %s' % (tag, relation))
-    if not re.match(allowed_options[1], arg_type):
+    if not allowed_options[1].match(arg_type):
       raise ValueError('tag %s and relation %s does not allow arg type %s' % (
           tag, relation, arg_type))
 
     if arg_type == 'cp' or arg_type == 'gid':
       is_hex = arg_type == 'cp'
-      int_set = parse_int_values(arg, is_hex)
-      self.tag_options[tag] = IntSetFilter(relation != 'except', int_set)
+      int_ranges = parse_int_ranges(arg, is_hex)
+      self.tag_options[tag] = IntSetFilter(relation != 'except', int_ranges)
     else:
       raise ValueError('illegal state - unable to handle recognized arg_type %s' % arg_type)
 
@@ -423,6 +507,7 @@ class TestSpec(object):
     self.touched_tags |= tags
     tags |= self._get_ancestor_tag_set(tag)
     self.enabled_tags |= tags
+    self._masks = None
 
   tag_rx = re.compile(r'\s*([0-9a-z/_]+)(?:\s+(except|only)\s+(cp|gid)\s+(.*))?\s*$')
   def enable_tag(self, tag_seg):
@@ -435,15 +520,33 @@ class TestSpec(object):
     tags = self._get_tag_set(tag)
     self.touched_tags |= tags
     self.enabled_tags -= tags
-
-  def apply_spec(self, result, options):
-    result -= self.touched_tags
-    result |= self.enabled_tags
+    self._masks = None
+
+  def _get_masks(self):
+    """Returns (touched, enabled) as int bitmasks over the class tag ids,
+    computed on first use after a change."""
+    if self._masks is None:
+      tag_ids = TestSpec._tag_ids
+      touched = 0
+      for tag in self.touched_tags:
+        touched |= 1 << tag_ids[tag]
+      enabled = 0
+      for tag in self.enabled_tags:
+        enabled |= 1 << tag_ids[tag]
+      self._masks = (touched, enabled)
+    return self._masks
+
+  def apply_spec(self, mask, options):
+    """Applies this spec to the bitmask of enabled tags, and updates options.
+    Returns the new mask."""
+    touched, enabled = self._get_masks()
+    mask = (mask & ~touched) | enabled
     for tag in self.touched_tags:
       options.pop(tag, None)
     for tag in self.enabled_tags:
       if tag in self.tag_options:
         options[tag] = self.tag_options[tag]
+    return mask
 
 
   # TODO(dougfelt): remove modify_line if no longer used
@@ -485,8 +588,11 @@ class LintTests(object):
   def __init__(self, tag_set, tag_filters):
     self.tag_set = tag_set
     self.tag_filters = tag_filters
-    self.run_log = set()
-    self.skip_log = set()
+    # the run/skip logs are bitmaps over the class tag ids; check is called
+    # from the innermost lint loops, and a bit set is cheaper than a set add
+    num_bytes = (len(TestSpec._id_to_tag) + 7) >> 3
+    self._run_bits = bytearray(num_bytes)
+    self._skip_bits = bytearray(num_bytes)
 
   def get_filter(self, tag):
     if tag not in TestSpec.tag_set:
@@ -494,13 +600,13 @@ class LintTests(object):
     return self.tag_filters.get(tag, None)
 
   def check(self, tag):
-    if tag not in TestSpec.tag_set:
+    try:
+      ix = TestSpec._tag_ids[tag]
+    except KeyError:
       raise ValueError('unrecognized tag ' + tag)
     run = tag in self.tag_set
-    if run:
-      self.run_log.add(tag)
-    else:
-      self.skip_log.add(tag)
+    bits = self._run_bits if run else self._skip_bits
+    bits[ix >> 3] |= 1 << (ix & 7)
     return run
 
   def checkvalue(self, tag, value):
@@ -509,27 +615,63 @@ class LintTests(object):
       run = self.tag_filters[tag].accept(value)
     return run
 
+  def bind(self, tag):
+    """Returns a no-arg callable equivalent to check(tag), with the tag
+    validated and its log bit resolved once.  Use it when the same tag is
+    checked repeatedly in an inner loop."""
+    try:
+      ix = TestSpec._tag_ids[tag]
+    except KeyError:
+      raise ValueError('unrecognized tag ' + tag)
+    run = tag in self.tag_set
+    bits = self._run_bits if run else self._skip_bits
+    byte_ix = ix >> 3
+    bit = 1 << (ix & 7)
+    def bound_check():
+      bits[byte_ix] |= bit
+      return run
+    return bound_check
+
+  def bindvalue(self, tag):
+    """Like bind, but returns a one-arg callable equivalent to
+    checkvalue(tag, value)."""
+    bound_check = self.bind(tag)
+    tag_filter = self.tag_filters.get(tag, None)
+    if not tag_filter:
+      return lambda value: bound_check()
+    accept = tag_filter.accept
+    def bound_checkvalue(value):
+      return bound_check() and accept(value)
+    return bound_checkvalue
+
+  def _log_tags(self, bits):
+    id_to_tag = TestSpec._id_to_tag
+    return set(id_to_tag[ix] for ix in xrange(len(id_to_tag))
+               if (bits[ix >> 3] >> (ix & 7)) & 1)
+
   def runlog(self):
-    return self.run_log
+    return self._log_tags(self._run_bits)
 
   def skiplog(self):
-    return self.skip_log
+    return self._log_tags(self._skip_bits)
 
   def __repr__(self):
+    run_log = self.runlog()
+    skip_log = self.skiplog()
     lines = []
-    if not (self.run_log or self.skip_log):
+    if not (run_log or skip_log):
       for tag in sorted(self.tag_set):
         tag_filter = self.tag_filters.get(tag, None)
         if tag_filter:
           lines.append('%s %s' % (tag, tag_filter))
         else:
           lines.append(tag)
-    if self.run_log:
-      lines.add('run:')
-      lines.append('  ' + t for t in self.run_log)
-    if self.skip_log:
-      lines.add('skipped:')
-      lines.append('  ' + t for t in self.skip_log)
+    if run_log:
+      lines.append('run:')
+      lines.extend('  ' + t for t in sorted(run_log))
+    if skip_log:
+      lines.append('skipped:')
+      lines.extend('  ' + t for t in sorted(skip_log))
     return '\n'.join(lines)
 
 
@@ -537,24 +679,48 @@ class LintSpec(object):
 
   def __init__(self):
     self.specs = []
+    self._relevant_fields = ()
+    self._cache = {}
 
   def add_spec(self, font_condition, test_spec):
     self.specs.append((font_condition, test_spec))
+    fields = set(self._relevant_fields)
+    fields.update(k for k, _, _ in font_condition._predicates)
+    self._relevant_fields = tuple(sorted(fields))
+    self._cache.clear()
 
   def get_tests(self, font_info):
-    result = set()
-    options = {}
-    result |= TestSpec.tag_set
-    for condition, spec in self.specs:
-      if condition.accepts(font_info):
-        spec.apply_spec(result, options)
-
-    return LintTests(frozenset(result), options)
+    # Fonts sharing the values of every condition-tested field get the same
+    # result, so cache on that fingerprint.  Each caller still gets a fresh
+    # LintTests since the run/skip logs are per-font state.
+    key = tuple(getattr(font_info, k, None) for k in self._relevant_fields)
+    try:
+      result, options = self._cache[key]
+    except KeyError:
+      mask = TestSpec._full_mask
+      options = {}
+      for condition, spec in self.specs:
+        if condition.accepts(font_info):
+          mask = spec.apply_spec(mask, options)
+
+      if mask == TestSpec._full_mask:
+        result = TestSpec.tag_set
+      else:
+        id_to_tag = TestSpec._id_to_tag
+        result = frozenset(
+            id_to_tag[ix] for ix in xrange(len(id_to_tag)) if (mask >> ix) & 1)
+      self._cache[key] = (result, options)
+    return LintTests(result, options)
 
   def __repr__(self):
     return 'spec:\n' + '\nspec:\n'.join(str(spec) for spec in self.specs)
 
 
+# a segment is the text between ';', '#', and newlines; comments run from '#'
+# to end of line.  One finditer pass over the whole spec replaces the per-line
+# comment search, strip, and split(';').
+_spec_segment_re = re.compile(r'([^;#\n]+)|#[^\n]*')
+
 def parse_spec(spec, lint_spec=None):
   if not lint_spec:
     lint_spec = LintSpec()
@@ -564,37 +730,34 @@ def parse_spec(spec, lint_spec=None):
   cur_condition = FontCondition()
   cur_test_spec = TestSpec()
   have_test = False
-  for line in spec.splitlines():
-    ix = line.find('#')
-    if ix > -1:
-      line = line[:ix]
-    line = line.strip()
-    if not line:
-      continue
-    for segment in line.split(';'):
+  for m in _spec_segment_re.finditer(spec):
+    segment = m.group(1)
+    if segment:
       segment = segment.strip()
-      if segment == 'condition':
-        if have_test:
-          lint_spec.add_spec(cur_condition.copy(), cur_test_spec)
-          cur_test_spec = TestSpec()
-          have_test = False
-        cur_condition = FontCondition()
-      elif segment.startswith('enable '):
-        segment = segment[len('enable '):]
-        for seg in segment.split(','):
-          cur_test_spec.enable_tag(seg.strip())
-        have_test = True
-      elif segment.startswith('disable '):
-        segment = segment[len('disable '):]
-        for seg in segment.split(','):
-          cur_test_spec.disable(seg.strip())
-        have_test = True
-      else:
-        if have_test:
-          lint_spec.add_spec(cur_condition.copy(), cur_test_spec)
-          cur_test_spec = TestSpec()
-          have_test = False
-        cur_condition.modify_line(segment)
+    if not segment:
+      continue
+    if segment == 'condition':
+      if have_test:
+        lint_spec.add_spec(cur_condition.copy(), cur_test_spec)
+        cur_test_spec = TestSpec()
+        have_test = False
+      cur_condition = FontCondition()
+    elif segment.startswith('enable '):
+      segment = segment[len('enable '):]
+      for seg in segment.split(','):
+        cur_test_spec.enable_tag(seg.strip())
+      have_test = True
+    elif segment.startswith('disable '):
+      segment = segment[len('disable '):]
+      for seg in segment.split(','):
+        cur_test_spec.disable(seg.strip())
+      have_test = True
+    else:
+      if have_test:
+        lint_spec.add_spec(cur_condition.copy(), cur_test_spec)
+        cur_test_spec = TestSpec()
+        have_test = False
+      cur_condition.modify_line(segment)
   if have_test:
     lint_spec.add_spec(cur_condition, cur_test_spec)
 
@@ -621,7 +784,7 @@ def main():
     data = TestSpec.tag_data[tag]
     comment = args.comments and data[2]
     if args.filters and (data[0] or data[1]):
-      filter = ' '.join(data[:2])
+      filter = ' '.join(rx.pattern for rx in data[:2])
     else:
       filter = None
     show_tag = args.tags or comment or filter
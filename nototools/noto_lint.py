@@ -1097,6 +1097,13 @@ def check_font(file_name,
         us_win_descent = font['OS/2'].usWinDescent
         font_ymin = None
         font_ymax = None
+
+        # bind the per-glyph checks once, outside the loop
+        check_glyph = tests.bind('bounds/glyph')
+        check_ui_ymax = tests.bindvalue('bounds/glyph/ui_ymax')
+        check_ui_ymin = tests.bindvalue('bounds/glyph/ui_ymin')
+        check_ymax = tests.bindvalue('bounds/glyph/ymax')
+        check_ymin = tests.bindvalue('bounds/glyph/ymin')
         for glyph_index in range(len(glyf_table.glyphOrder)):
             glyph_name = glyf_table.glyphOrder[glyph_index]
             glyph = glyf_table[glyph_name]
@@ -1105,31 +1112,31 @@ def check_font(file_name,
             font_ymin = render.min_with_none(font_ymin, ymin)
             font_ymax = render.max_with_none(font_ymax, ymax)
 
-            if not tests.check('bounds/glyph'):
+            if not check_glyph():
                 continue
 
             if is_ui or deemed_ui:
-                if (tests.checkvalue('bounds/glyph/ui_ymax', glyph_index) and
+                if (check_ui_ymax(glyph_index) and
                     ymax is not None and ymax > MAX_UI_HEIGHT):
                     warn(
                         "Bounds",
                         "Real yMax for glyph %d (%s) is %d, which is more than "
                         "%d." % (glyph_index, glyph_name, ymax, MAX_UI_HEIGHT))
-                if (tests.checkvalue('bounds/glyph/ui_ymin', glyph_index) and
+                if (check_ui_ymin(glyph_index) and
                     ymin is not None and ymin < MIN_UI_HEIGHT):
                     warn(
                         "Bounds",
                         "Real yMin for glyph %d (%s) is %d, which is less than "
                         "%d." % (glyph_index, glyph_name, ymin, MIN_UI_HEIGHT))
 
-            if (tests.checkvalue('bounds/glyph/ymax', glyph_index) and ymax is not None and
+            if (check_ymax(glyph_index) and ymax is not None and
                 ymax > us_win_ascent):
                 warn(
                     "Bounds",
                     "Real yMax for glyph %d (%s) is %d, which is higher than "
                     "the font's usWinAscent (%d), resulting in clipping." %
                     (glyph_index, glyph_name, ymax, us_win_ascent))
-            if (tests.checkvalue('bounds/glyph/ymin', glyph_index) and ymin is not None and
+            if (check_ymin(glyph_index) and ymin is not None and
                 ymin < -us_win_descent):
                 warn(
                     "Bounds",
@@ -19,6 +19,7 @@
 __author__ = "dougfelt@google.com (Doug Felt)"
 
 import argparse
+import multiprocessing
 import os
 import os.path
 import re
@@ -30,24 +31,28 @@ import noto_lint
 import font_data
 
 def get_largest_cmap(font):
+  # Select the table before touching .cmap, so we don't force a decompile of
+  # the format 4 table when a format 12 table supersedes it.
   cmap_table = font['cmap']
-  cmap = None
+  best = None
   for table in cmap_table.tables:
     tup = (table.format, table.platformID, table.platEncID)
     if tup == (4, 3, 1):
       # Continue scan because we prefer the other cmap if it exists.
-      cmap = table.cmap
+      best = table
     elif tup == (12, 3, 10):
       # Stop scan if we find this cmap. Should be strictly larger than the other.
-      cmap = table.cmap
+      best = table
       break
-  return cmap
+  return best.cmap if best else None
 
 def cmap_count(font):
   return len(get_largest_cmap(font))
 
-def summarize_file(root, path):
-  font = ttLib.TTFont(path)
+def summarize_file(root, path, size=None):
+  # the summary only touches the name, head, cmap, and glyph order data, so
+  # open lazily and let fontTools skip decompiling everything else
+  font = ttLib.TTFont(path, lazy=True)
   table_info = {}
   reader = font.reader
   for tag in reader.keys():
@@ -58,8 +63,9 @@ def summarize_file(root, path):
       entry_checkSum += 0x100000000
     table_info[tag] = (entry_len, entry_checkSum)
 
-  relpath = path[len(root) + 1:]
-  size = os.path.getsize(path)
+  relpath = os.path.relpath(path, root)
+  if size is None:
+    size = os.path.getsize(path)
   # Printable_font_revision requires you specify the accuracy of digits.
   # ttLib apparently reads the fixed values as a float, so it loses the info.
   # Adobe fonts use 3 digits, so the default from printable_font_revision of 2
@@ -73,25 +79,45 @@ def summarize_file(root, path):
     version = noto_lint.printable_font_revision(font) # default 2
   num_glyphs = len(font.getGlyphOrder())
   full_name = font_data.get_name_records(font)[4]
-  cmap = set(get_largest_cmap(font).keys()) # copy needed? what's the lifespan?
-  num_chars = len(cmap)
+  cmap_data = get_largest_cmap(font)
+  num_chars = len(cmap_data)
+  # copy the keys (iterating the dict avoids the intermediate keys() list);
+  # the summary tuple outlives the font, and callers rely on set operations
+  cmap = frozenset(cmap_data)
   font.close()
 
   return (relpath, version, full_name, size, num_glyphs, num_chars, cmap, table_info)
 
+def _summarize_file_task(root_and_path):
+  # module level so the worker pool can pickle it
+  return summarize_file(*root_and_path)
+
 def summarize(root, name=None):
-  result = []
+  tasks = []
   name_re = re.compile(name) if name else None
   for parent, _, files in os.walk(root):
     for f in sorted(files):
       if f.endswith('.ttf') or f.endswith('.otf'):
         path = os.path.join(parent, f)
         if name_re:
-          relpath = path[len(root) + 1:]
+          relpath = os.path.relpath(path, root)
           if not name_re.search(relpath):
             continue
-        result.append(summarize_file(root, path))
-  return result
+        # stat here while the directory data is warm and pass the size along,
+        # so summarize_file doesn't stat the file a second time
+        tasks.append((root, path, os.path.getsize(path)))
+
+  if len(tasks) < 2:
+    return [summarize_file(*task) for task in tasks]
+
+  # each font is parsed independently, so fan the parsing out to a pool of
+  # workers, one per core.  map preserves the traversal order.
+  pool = multiprocessing.Pool()
+  try:
+    return pool.map(_summarize_file_task, tasks)
+  finally:
+    pool.close()
+    pool.join()
 
 
 def print_tup(tup, short):
@@ -102,7 +128,7 @@ def print_tup(tup, short):
         parts.append('%s=%s' % (tag, val[tag][0]))
       result = ', '.join(parts)
     else:
-      if idx == 6 and type(val) == type(set()):
+      if idx == 6 and isinstance(val, frozenset):
         result = noto_lint.printable_unicode_range(val)
       else:
         result = str(val)
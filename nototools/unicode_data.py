@@ -27,23 +27,36 @@ __author__ = (
     "roozbeh@google.com (Roozbeh Pournader) and "
     "cibu@google.com (Cibu Johny)")
 
+from array import array
+import bisect
+import cPickle as pickle
+from cStringIO import StringIO
 import os
 from os import path
-import re
+import sys
+import threading
 import unicodedata  # Python's internal library
 
 
 _data_is_loaded = False
 _property_value_aliases_data = {}
-_character_names_data = {}
+# Character names are kept as one concatenated blob plus parallel sorted
+# arrays of codepoints and blob offsets, instead of ~34k tiny str objects
+# in a dict; name lookups bisect the code array and slice the blob.
+_character_names_codes = array('I')
+_character_names_offsets = array('I', [0])
+_character_names_blob = b''
 _general_category_data = {}
+_general_category_range_data = ([], [], [])
 _combining_class_data = {}
+_combining_class_range_data = ([], [], [])
 _decomposition_data = {}
 _bidi_mirroring_characters = set()
-_script_data = {}
-_script_extensions_data = {}
-_block_data = {}
-_age_data = {}
+_script_range_data = ([], [], [])
+_script_extensions_range_data = ([], [], [])
+_block_range_data = ([], [], [])
+_age_range_data = ([], [], [])
+_age_ranges = []
 _bidi_mirroring_glyph_data = {}
 _core_properties_data = {}
 _defined_characters = set()
@@ -51,24 +64,125 @@ _script_code_to_long_name = {}
 _script_long_name_to_code = {}
 _lower_to_upper_case = {}
 
+# the UCD files load_data parses, and the globals holding the parsed result;
+# bump _UCD_CACHE_VERSION whenever the shape of any cached global changes
+_UCD_DATA_FILES = (
+    "PropertyValueAliases.txt", "UnicodeData.txt", "Scripts.txt",
+    "ScriptExtensions.txt", "Blocks.txt", "DerivedAge.txt",
+    "DerivedCoreProperties.txt", "BidiMirroring.txt")
+_CACHED_DATA_NAMES = (
+    "_character_names_codes", "_character_names_offsets",
+    "_character_names_blob", "_general_category_data",
+    "_general_category_range_data", "_combining_class_data",
+    "_combining_class_range_data", "_decomposition_data",
+    "_bidi_mirroring_characters", "_script_range_data",
+    "_script_extensions_range_data", "_block_range_data", "_age_range_data",
+    "_age_ranges",
+    "_bidi_mirroring_glyph_data", "_core_properties_data",
+    "_defined_characters", "_script_code_to_long_name",
+    "_script_long_name_to_code", "_lower_to_upper_case")
+_UCD_CACHE_VERSION = 4
+
+
+def _try_load_cache(cache_path):
+    """Returns the cached parsed data, or None if the cache is missing,
+    stale relative to any of the data files, or unreadable."""
+    try:
+        cache_mtime = path.getmtime(cache_path)
+    except OSError:
+        return None
+    for file_name in _UCD_DATA_FILES:
+        try:
+            if path.getmtime(path.join(_DATA_DIR_PATH, file_name)) >= cache_mtime:
+                return None
+        except OSError:
+            return None
+    try:
+        with open(cache_path, "rb") as cache_file:
+            version, data = pickle.load(cache_file)
+    except (EnvironmentError, EOFError, pickle.UnpicklingError, ValueError):
+        return None
+    if version != _UCD_CACHE_VERSION:
+        return None
+    return data
+
+
+def _write_cache(cache_path, data):
+    try:
+        with open(cache_path, "wb") as cache_file:
+            pickle.dump((_UCD_CACHE_VERSION, data), cache_file,
+                        pickle.HIGHEST_PROTOCOL)
+    except EnvironmentError:
+        pass  # the cache is only an optimization, the parse already succeeded
+
+
+def _read_data_files():
+    """Reads all the UCD files at once, one thread per file.
+
+    The files are independent and CPython releases the GIL during read(),
+    so the I/O overlaps.  Returns a dict mapping file name to contents;
+    if any read fails, the first error is re-raised in the caller."""
+    texts = {}
+    errors = []
+
+    def read_file(file_name):
+        try:
+            with open_unicode_data_file(file_name) as data_file:
+                texts[file_name] = data_file.read()
+        except Exception:
+            errors.append(sys.exc_info())
+
+    threads = [threading.Thread(target=read_file, args=(file_name,))
+               for file_name in _UCD_DATA_FILES]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        exc_type, exc_value, exc_traceback = errors[0]
+        raise exc_type, exc_value, exc_traceback
+    return texts
+
+
 def load_data():
     """Loads the data files needed for the module.
 
     Could be used by processes who care about controlling when the data is
     loaded. Otherwise, data will be loaded the first time it's needed.
+
+    The parsed data is cached in a pickle next to the data files, so that
+    one-shot tool invocations don't reparse the UCD text every time; set
+    NOTO_UCD_CACHE=0 to disable the cache.
     """
     global _data_is_loaded
 
-    if not _data_is_loaded:
-        _load_property_value_aliases_txt()
-        _load_unicode_data_txt()
-        _load_scripts_txt()
-        _load_script_extensions_txt()
-        _load_blocks_txt()
-        _load_derived_age_txt()
-        _load_derived_core_properties_txt()
-        _load_bidi_mirroring_txt()
-        _data_is_loaded = True
+    if _data_is_loaded:
+        return
+
+    cache_path = path.join(_DATA_DIR_PATH, "ucd.cache")
+    use_cache = os.environ.get("NOTO_UCD_CACHE", "1") != "0"
+    data = _try_load_cache(cache_path) if use_cache else None
+    if data is not None:
+        globals().update(data)
+    else:
+        if not _hex4:
+            _hex4.update(("%04X" % value, value) for value in xrange(0x10000))
+        texts = _read_data_files()
+        # parsing stays serial and in this order; the aliases must be
+        # loaded before the scripts so long names resolve to codes
+        _load_property_value_aliases_txt(texts["PropertyValueAliases.txt"])
+        _load_unicode_data_txt(texts["UnicodeData.txt"])
+        _load_scripts_txt(texts["Scripts.txt"])
+        _load_script_extensions_txt(texts["ScriptExtensions.txt"])
+        _load_blocks_txt(texts["Blocks.txt"])
+        _load_derived_age_txt(texts["DerivedAge.txt"])
+        _load_derived_core_properties_txt(texts["DerivedCoreProperties.txt"])
+        _load_bidi_mirroring_txt(texts["BidiMirroring.txt"])
+        if use_cache:
+            module_globals = globals()
+            _write_cache(cache_path, dict(
+                (name, module_globals[name]) for name in _CACHED_DATA_NAMES))
+    _data_is_loaded = True
 
 
 def name(char, *args):
@@ -85,40 +199,97 @@ def name(char, *args):
         return unicodedata.name(char)
     except ValueError as val_error:
         load_data()
-        if ord(char) in _character_names_data:
-            return _character_names_data[ord(char)]
+        code = ord(char)
+        index = bisect.bisect_left(_character_names_codes, code)
+        if (index < len(_character_names_codes)
+                and _character_names_codes[index] == code):
+            return _character_names_blob[
+                _character_names_offsets[index]:
+                _character_names_offsets[index+1]]
         elif args:
             return args[0]
         else:
             raise val_error
 
 
+_STR_TYPES = (str, unicode)
+
+
 def _char_to_int(char):
     """Converts a potential character to its scalar value."""
-    if type(char) in [str, unicode]:
+    if isinstance(char, _STR_TYPES):
         return ord(char)
     else:
         return char
 
 
+def _memoize_char_query(func):
+    """Caches a single-character query function, keyed on the scalar value.
+
+    The lint and coverage tools ask about the same codepoints over and over
+    across fonts.  Python 2 has no functools.lru_cache, so use a plain dict;
+    the key space is bounded by the number of codepoints queried."""
+    cache = {}
+    def wrapper(char):
+        char = _char_to_int(char)
+        try:
+            return cache[char]
+        except KeyError:
+            # the one place the load guard runs; cache hits skip it entirely
+            load_data()
+            value = func(char)
+            cache[char] = value
+            return value
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def _build_range_data(ranges, transform=None):
+    """Converts a list of (first, last, value) tuples into parallel sorted
+    lists for bisect lookup, optionally transforming each value.  Keeping the
+    data as ranges instead of one dict entry per codepoint saves both load
+    time and memory; Unicode properties are a few hundred ranges covering
+    hundreds of thousands of codepoints."""
+    firsts = []
+    lasts = []
+    values = []
+    for first, last, value in sorted(ranges):
+        firsts.append(first)
+        lasts.append(last)
+        values.append(transform(value) if transform else value)
+    return firsts, lasts, values
+
+
+def _range_value(range_data, char):
+    """Returns the value of the range containing char, or None."""
+    firsts, lasts, values = range_data
+    i = bisect.bisect_right(firsts, char) - 1
+    if i >= 0 and char <= lasts[i]:
+        return values[i]
+    return None
+
+
+@_memoize_char_query
 def category(char):
     """Returns the general category of a character."""
-    load_data()
     char = _char_to_int(char)
     try:
         return _general_category_data[char]
     except KeyError:
-        return "Cn"  # Unassigned
+        value = _range_value(_general_category_range_data, char)
+        return value if value is not None else "Cn"  # Unassigned
 
 
+@_memoize_char_query
 def combining(char):
     """Returns the canonical combining class of a character."""
-    load_data()
     char = _char_to_int(char)
     try:
         return _combining_class_data[char]
     except KeyError:
-        return 0
+        value = _range_value(_combining_class_range_data, char)
+        return value if value is not None else 0
 
 
 def to_upper(char):
@@ -135,10 +306,10 @@ def to_upper(char):
     return char
 
 
+@_memoize_char_query
 def canonical_decomposition(char):
     """Returns the canonical decomposition of a character as a Unicode string.
     """
-    load_data()
     char = _char_to_int(char)
     try:
         return _decomposition_data[char]
@@ -146,64 +317,52 @@ def canonical_decomposition(char):
         return u""
 
 
+@_memoize_char_query
 def script(char):
     """Returns the script property of a character as a four-letter code."""
-    load_data()
     char = _char_to_int(char)
-    try:
-        return _script_data[char]
-    except KeyError:
-        return "Zzzz"  # Unknown
+    value = _range_value(_script_range_data, char)
+    return value if value is not None else "Zzzz"  # Unknown
 
 
+@_memoize_char_query
 def script_extensions(char):
     """Returns the script extensions property of a character.
 
     The return value is a frozenset of four-letter script codes.
     """
-    load_data()
     char = _char_to_int(char)
-    try:
-        return _script_extensions_data[char]
-    except KeyError:
-        return frozenset(script(char))
+    value = _range_value(_script_extensions_range_data, char)
+    return value if value is not None else frozenset(script(char))
 
 
+@_memoize_char_query
 def block(char):
     """Returns the block property of a character."""
-    load_data()
     char = _char_to_int(char)
-    try:
-        return _block_data[char]
-    except KeyError:
-        return "No_Block"
+    value = _range_value(_block_range_data, char)
+    return value if value is not None else "No_Block"
 
 
+@_memoize_char_query
 def age(char):
     """Returns the age property of a character as a string.
 
     Returns None if the character is unassigned."""
-    load_data()
     char = _char_to_int(char)
-    try:
-        return _age_data[char]
-    except KeyError:
-        return None
+    return _range_value(_age_range_data, char)
 
 
+@_memoize_char_query
 def is_default_ignorable(char):
     """Returns true if the character has the Default_Ignorable property."""
-    load_data()
-    if type(char) in [str, unicode]:
-        char = ord(char)
-    return char in _core_properties_data["Default_Ignorable_Code_Point"]
+    bits = _core_properties_data["Default_Ignorable_Code_Point"]
+    return bool((bits[char >> 3] >> (char & 7)) & 1)
 
 
+@_memoize_char_query
 def is_defined(char):
     """Returns true if the character is defined in the Unicode Standard."""
-    load_data()
-    if type(char) in [str, unicode]:
-        char = ord(char)
     return char in _defined_characters
 
 
@@ -212,19 +371,15 @@ def is_private_use(char):
     return category(char) == "Co"
 
 
+@_memoize_char_query
 def mirrored(char):
     """Returns 1 if the characters is bidi mirroring, 0 otherwise."""
-    load_data()
-    if type(char) in [str, unicode]:
-        char = ord(char)
     return int(char in _bidi_mirroring_characters)
 
 
+@_memoize_char_query
 def bidi_mirroring_glyph(char):
     """Returns the bidi mirroring glyph property of a character."""
-    load_data()
-    if type(char) in [str, unicode]:
-        char = ord(char)
     try:
         return _bidi_mirroring_glyph_data[char]
     except KeyError:
@@ -242,8 +397,11 @@ def defined_characters(version=None, scr=None):
         pass
     characters = _defined_characters
     if version is not None:
-        characters = {char for char in characters
-                      if age(char) is not None and float(age(char)) <= version}
+        aged = set()
+        for first, last, age_value in _age_ranges:
+            if age_value <= version:
+                aged.update(xrange(first, last+1))
+        characters = characters & aged
     if scr is not None:
         characters = {char for char in characters
                       if script(char) == scr or scr in script_extensions(char)}
@@ -309,13 +467,19 @@ def open_unicode_data_file(data_file_name):
     return open(path.join(_DATA_DIR_PATH, data_file_name), "r")
 
 
+# The parsers below deliberately stay pure Python.  nototools is distributed
+# as a pure-python package with no compiled extensions, and the pickled UCD
+# cache means a full text parse only happens when the data files change, so
+# a C or Cython parser would speed up a path that is already cold.
+
+
 def _parse_code_ranges(input_data):
-    """Reads Unicode code ranges with properties from an input string.
+    """Reads Unicode code ranges with properties from Unicode data.
 
-    Reads a Unicode data file already imported into a string. The format is
-    the typical Unicode data file format with either one character or a
-    range of characters separated by a semicolon with a property value (and
-    potentially comments after a number sign, that will be ignored).
+    Reads a Unicode data file's contents. The format is the typical Unicode
+    data file format with either one character or a range of characters
+    separated by a semicolon with a property value (and potentially
+    comments after a number sign, that will be ignored).
 
     Example source data file:
       http://www.unicode.org/Public/UNIDATA/Scripts.txt
@@ -325,7 +489,8 @@ def _parse_code_ranges(input_data):
       0020          ; Common # Zs       SPACE
 
     Args:
-      input_data: An input string, containing the data.
+      input_data: The data as a string, a file handle, or any other
+          iterable of lines.
 
     Returns:
       A list of tuples corresponding to the input data, with each tuple
@@ -334,37 +499,57 @@ def _parse_code_ranges(input_data):
       [(0, 31, 'Common'), (32, 32, 'Common')]
     """
     ranges = []
-    line_regex = re.compile(
-        r"^"  # beginning of line
-        r"([0-9A-F]{4,6})"  # first character code
-        r"(?:\.\.([0-9A-F]{4,6}))?"  # optional second character code
-        r"\s*;\s*"
-        r"([^#]+)")  # the data, up until the potential comment
-    for line in input_data.split("\n"):
-        match = line_regex.match(line)
-        if not match:  # Skip lines that don't match the pattern
+    for line in _iter_lines(input_data):
+        # the format is simple enough to scan with partition, which is a
+        # single C-level pass, instead of a regex per line
+        head = line.partition("#")[0]
+        codes, sep, data = head.partition(";")
+        if not sep:
+            continue
+        data = data.strip()
+        if not data:
+            continue
+        first, sep, last = codes.strip().partition("..")
+        try:
+            first = _int16(first)
+            last = _int16(last) if sep else first
+        except ValueError:  # Skip lines that don't match the pattern
             continue
-
-        first, last, data = match.groups()
-        if last is None:
-            last = first
-
-        first = int(first, 16)
-        last = int(last, 16)
-        data = data.rstrip()
 
         ranges.append((first, last, data))
 
     return ranges
 
 
+# Lookup table mapping the 4-digit uppercase hex strings that dominate the
+# UCD code columns straight to ints; filled in by load_data before parsing.
+_hex4 = {}
+
+
+def _int16(text):
+    """Parses a hex code column, via the table for the common 4-digit case."""
+    try:
+        return _hex4[text]
+    except KeyError:
+        return int(text, 16)
+
+
+def _iter_lines(input_data):
+    """Iterates the lines of a string, file handle, or iterable of lines.
+
+    Strings go through cStringIO so the lines are produced one at a time
+    instead of materializing a full list the way split('\\n') would."""
+    if isinstance(input_data, basestring):
+        return iter(StringIO(input_data))
+    return iter(input_data)
+
+
 def _parse_semicolon_separated_data(input_data):
-    """Reads semicolon-separated Unicode data from an input string.
+    """Reads semicolon-separated Unicode data from Unicode data.
 
-    Reads a Unicode data file already imported into a string. The format is
-    the Unicode data file format with a list of values separated by
-    semicolons. The number of the values on different lines may be different
-    from another.
+    Reads a Unicode data file's contents. The format is the Unicode data
+    file format with a list of values separated by semicolons. The number
+    of the values on different lines may be different from another.
 
     Example source data file:
       http://www.unicode.org/Public/UNIDATA/PropertyValueAliases.txt
@@ -374,7 +559,8 @@ def _parse_semicolon_separated_data(input_data):
       sc;  Copt  ; Coptic   ; Qaac
 
     Args:
-      input_data: An input string, containing the data.
+      input_data: The data as a string, a file handle, or any other
+          iterable of lines.
 
     Returns:
       A list of lists corresponding to the input data, with each individual
@@ -382,45 +568,48 @@ def _parse_semicolon_separated_data(input_data):
       [['sc', 'Cher', 'Cherokee'], ['sc', 'Copt', 'Coptic', 'Qaac']]
     """
     all_data = []
-    for line in input_data.split('\n'):
-        line = line.split('#', 1)[0].strip()  # remove the comment
+    for line in _iter_lines(input_data):
+        line = line.partition('#')[0].strip()  # remove the comment
         if not line:
             continue
 
-        fields = line.split(';')
-        fields = [field.strip() for field in fields]
-        all_data.append(fields)
+        all_data.append([field.strip() for field in line.split(';')])
 
     return all_data
 
 
-def _load_unicode_data_txt():
+def _load_unicode_data_txt(text):
     """Load character data from UnicodeData.txt."""
     global _defined_characters
     global _bidi_mirroring_characters
-
-    with open_unicode_data_file("UnicodeData.txt") as unicode_data_txt:
-        unicode_data = _parse_semicolon_separated_data(unicode_data_txt.read())
-
+    global _general_category_range_data
+    global _combining_class_range_data
+    global _character_names_codes
+    global _character_names_offsets
+    global _character_names_blob
+
+    unicode_data = _parse_semicolon_separated_data(text)
+
+    category_ranges = []
+    combining_ranges = []
+    # UnicodeData.txt lists codepoints in ascending order, so the name
+    # arrays come out sorted by simply appending
+    name_codes = array('I')
+    name_offsets = array('I', [0])
+    name_blob = bytearray()
     for line in unicode_data:
-        code = int(line[0], 16)
+        code = _int16(line[0])
         char_name = line[1]
-        general_category = line[2]
+        # intern the ~30 category strings so every entry shares one object
+        general_category = intern(line[2])
         combining_class = int(line[3])
 
         decomposition = line[5]
-        if decomposition.startswith('<'):
-            # We only care about canonical decompositions
-            decomposition = ''
-        decomposition = decomposition.split()
-        decomposition = [unichr(int(char, 16)) for char in decomposition]
-        decomposition = ''.join(decomposition)
-
         bidi_mirroring = (line[9] == 'Y')
         if general_category == 'Ll':
           upcode = line[12]
           if upcode:
-            upper_case = int(upcode, 16)
+            upper_case = _int16(upcode)
             _lower_to_upper_case[code] = upper_case
 
         if char_name.endswith("First>"):
@@ -428,97 +617,127 @@ def _load_unicode_data_txt():
         elif char_name.endswith("Last>"):
             # Ignore surrogates
             if "Surrogate" not in char_name:
-                for char in xrange(last_range_opener, code+1):
-                    _general_category_data[char] = general_category
-                    _combining_class_data[char] = combining_class
-                    if bidi_mirroring:
-                        _bidi_mirroring_characters.add(char)
-                    _defined_characters.add(char)
+                # these First/Last blocks cover tens of thousands of
+                # codepoints (CJK, Hangul, private use), so record one range
+                # instead of one dict entry per codepoint
+                category_ranges.append(
+                    (last_range_opener, code, general_category))
+                combining_ranges.append(
+                    (last_range_opener, code, combining_class))
+                if bidi_mirroring:
+                    _bidi_mirroring_characters.update(
+                        xrange(last_range_opener, code+1))
+                _defined_characters.update(xrange(last_range_opener, code+1))
         else:
-            _character_names_data[code] = char_name
+            name_codes.append(code)
+            name_blob.extend(char_name)
+            name_offsets.append(len(name_blob))
             _general_category_data[code] = general_category
             _combining_class_data[code] = combining_class
             if bidi_mirroring:
                 _bidi_mirroring_characters.add(code)
-            _decomposition_data[code] = decomposition
+            # only canonical decompositions matter, and ~99% of characters
+            # have none at all; store nothing for those and let
+            # canonical_decomposition answer u'' on the dict miss
+            if decomposition and not decomposition.startswith('<'):
+                _decomposition_data[code] = u''.join(
+                    unichr(_int16(piece)) for piece in decomposition.split())
             _defined_characters.add(code)
 
+    _general_category_range_data = _build_range_data(category_ranges)
+    _combining_class_range_data = _build_range_data(combining_ranges)
+    _character_names_codes = name_codes
+    _character_names_offsets = name_offsets
+    _character_names_blob = bytes(name_blob)
     _defined_characters = frozenset(_defined_characters)
     _bidi_mirroring_characters = frozenset(_bidi_mirroring_characters)
 
 
-def _load_scripts_txt():
+def _load_scripts_txt(text):
     """Load script property from Scripts.txt."""
-    with open_unicode_data_file("Scripts.txt") as scripts_txt:
-        script_ranges = _parse_code_ranges(scripts_txt.read())
+    global _script_range_data
+    script_ranges = _parse_code_ranges(text)
 
-    for first, last, script_name in script_ranges:
-        for char_code in xrange(first, last+1):
-            _script_data[char_code] = _script_long_name_to_code[script_name]
+    _script_range_data = _build_range_data(
+        script_ranges,
+        transform=lambda script_name: _script_long_name_to_code[script_name])
 
 
-def _load_script_extensions_txt():
+def _load_script_extensions_txt(text):
     """Load script property from ScriptExtensions.txt."""
-    with open_unicode_data_file("ScriptExtensions.txt") as se_txt:
-        script_extensions_ranges = _parse_code_ranges(se_txt.read())
+    global _script_extensions_range_data
+    script_extensions_ranges = _parse_code_ranges(text)
 
-    for first, last, script_names in script_extensions_ranges:
-        script_set = frozenset(script_names.split(' '))
-        for character_code in xrange(first, last+1):
-            _script_extensions_data[character_code] = script_set
+    _script_extensions_range_data = _build_range_data(
+        script_extensions_ranges,
+        transform=lambda script_names: frozenset(
+            intern(code) for code in script_names.split(' ')))
 
 
-def _load_blocks_txt():
+def _load_blocks_txt(text):
     """Load block name from Blocks.txt."""
-    with open_unicode_data_file("Blocks.txt") as blocks_txt:
-        block_ranges = _parse_code_ranges(blocks_txt.read())
+    global _block_range_data
+    block_ranges = _parse_code_ranges(text)
 
-    for first, last, block_name in block_ranges:
-        for character_code in xrange(first, last+1):
-            _block_data[character_code] = block_name
+    _block_range_data = _build_range_data(block_ranges, transform=intern)
 
 
-def _load_derived_age_txt():
+def _load_derived_age_txt(text):
     """Load age property from DerivedAge.txt."""
-    with open_unicode_data_file("DerivedAge.txt") as derived_age_txt:
-        age_ranges = _parse_code_ranges(derived_age_txt.read())
+    global _age_range_data
+    global _age_ranges
+    age_ranges = _parse_code_ranges(text)
 
-    for first, last, char_age in age_ranges:
-        for char_code in xrange(first, last+1):
-            _age_data[char_code] = char_age
+    _age_range_data = _build_range_data(age_ranges, transform=intern)
+    # the same ranges with the age parsed as a float, so version queries
+    # can sweep a few hundred ranges instead of every defined character
+    _age_ranges = [(first, last, float(char_age))
+                   for first, last, char_age in age_ranges]
 
 
-def _load_derived_core_properties_txt():
+def _load_derived_core_properties_txt(text):
     """Load derived core properties from Blocks.txt."""
-    with open_unicode_data_file("DerivedCoreProperties.txt") as dcp_txt:
-        dcp_ranges = _parse_code_ranges(dcp_txt.read())
+    dcp_ranges = _parse_code_ranges(text)
 
+    # each property holds a dense bitmap over the codepoint space (one bit
+    # per codepoint, ~136KB) rather than a set of int objects; ranges fill
+    # whole interior bytes in one slice assignment
     for first, last, property_name in dcp_ranges:
-        for character_code in xrange(first, last+1):
-            try:
-                _core_properties_data[property_name].add(character_code)
-            except KeyError:
-                _core_properties_data[property_name] = {character_code}
+        try:
+            bits = _core_properties_data[property_name]
+        except KeyError:
+            bits = bytearray((0x110000 + 7) >> 3)
+            _core_properties_data[property_name] = bits
+        first_byte = first >> 3
+        last_byte = last >> 3
+        if first_byte == last_byte:
+            bits[first_byte] |= (
+                (0xFF >> (7 - (last & 7))) & (0xFF << (first & 7)))
+        else:
+            bits[first_byte] |= 0xFF << (first & 7) & 0xFF
+            bits[last_byte] |= 0xFF >> (7 - (last & 7))
+            if last_byte > first_byte + 1:
+                bits[first_byte+1:last_byte] = (
+                    b'\xff' * (last_byte - first_byte - 1))
 
 
-def _load_property_value_aliases_txt():
+def _load_property_value_aliases_txt(text):
     """Load property value aliases from PropertyValueAliases.txt."""
-    with open_unicode_data_file("PropertyValueAliases.txt") as pva_txt:
-        aliases = _parse_semicolon_separated_data(pva_txt.read())
+    aliases = _parse_semicolon_separated_data(text)
 
     for data_item in aliases:
         if data_item[0] == 'sc': # Script
-            code = data_item[1]
-            long_name = data_item[2]
+            # interned so the script range data all points at these objects
+            code = intern(data_item[1])
+            long_name = intern(data_item[2])
             _script_code_to_long_name[code] = long_name
             _script_long_name_to_code[long_name] = code
 
-def _load_bidi_mirroring_txt():
+def _load_bidi_mirroring_txt(text):
     """Load bidi mirroring glyphs from BidiMirroring.txt."""
-    with open_unicode_data_file("BidiMirroring.txt") as bidi_mirroring_txt:
-        bmg_pairs = _parse_semicolon_separated_data(bidi_mirroring_txt.read())
+    bmg_pairs = _parse_semicolon_separated_data(text)
 
     for char, bmg in bmg_pairs:
-        char = int(char, 16)
-        bmg = int(bmg, 16)
+        char = _int16(char)
+        bmg = _int16(bmg)
         _bidi_mirroring_glyph_data[char] = bmg